@@ -1,12 +1,18 @@
+import heapq
 import math
-import re
-from collections import Counter
+import os
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
-import pandas as pd
+from numba import njit
+import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 
 FILE_PATH = 'prescricoes_all.parquet'
+PREFETCH_DEPTH = 2
 
 pf = pq.ParquetFile(FILE_PATH)
 columns = pf.schema.names
@@ -15,14 +21,14 @@ null_counts = {col: 0 for col in columns}
 empty_counts = {col: 0 for col in columns}
 
 categorical_counters = {
-    'SEXO': Counter(),
-    'TIPO_RECEITUARIO': Counter(),
-    'UNIDADE_IDADE': Counter(),
-    'UNIDADE_MEDIDA': Counter(),
-    'CONSELHO_PRESCRITOR': Counter(),
-    'UF_CONSELHO_PRESCRITOR': Counter(),
-    'UF_VENDA': Counter(),
-    'Ansiolítico/Sedativo/Hipnótico': Counter(),
+    'SEXO': defaultdict(int),
+    'TIPO_RECEITUARIO': defaultdict(int),
+    'UNIDADE_IDADE': defaultdict(int),
+    'UNIDADE_MEDIDA': defaultdict(int),
+    'CONSELHO_PRESCRITOR': defaultdict(int),
+    'UF_CONSELHO_PRESCRITOR': defaultdict(int),
+    'UF_VENDA': defaultdict(int),
+    'Ansiolítico/Sedativo/Hipnótico': defaultdict(int),
 }
 
 numeric_specs = {
@@ -39,66 +45,240 @@ range_limits = {
 
 range_issues = {col: 0 for col in range_limits}
 
+# Categorical columns are read dictionary-encoded so they are counted per code
+dictionary_columns = [col for col in categorical_counters if col in columns]
+
 pattern_issues = {
     'ID': 0,
     'CID10': 0,
 }
 
-id_pattern = re.compile(r'^\d{4}-\d{8}$')
-cid10_pattern = re.compile(r'^[A-Z]\d{2}[A-Z0-9]?(?:\.\d{1,4})?$')
+id_pattern = r'^\d{4}-\d{8}$'
+cid10_pattern = r'^[A-Z]\d{2}[A-Z0-9]?(?:\.\d{1,4})?$'
+# Same values the fast float cast accepts (and pd.to_numeric did), including inf/infinity
+numeric_text_pattern = r'(?i)^[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:e[+-]?\d+)?$|^[+-]?inf(?:inity)?$'
 
-rows_processed = 0
-for rg_index in range(pf.num_row_groups):
-    table = pf.read_row_group(rg_index)
-    df = table.to_pandas()
-    rows_processed += len(df)
 
-    for col in columns:
-        series = df[col]
-        null_counts[col] += series.isna().sum()
-        if series.notna().any():
-            empty_counts[col] += series.dropna().astype(str).str.strip().eq('').sum()
+def is_text_type(data_type: pa.DataType) -> bool:
+    if pa.types.is_dictionary(data_type):
+        data_type = data_type.value_type
+    return pa.types.is_string(data_type) or pa.types.is_large_string(data_type)
+
+
+def as_text(col: pa.ChunkedArray) -> pa.ChunkedArray:
+    # Dictionary-encoded and non-string columns are compared on their string view
+    if pa.types.is_string(col.type):
+        return col
+    return pc.cast(col, pa.string())
+
+
+def count_true(mask: pa.ChunkedArray) -> int:
+    return pc.sum(mask).as_py() or 0
+
+
+def parse_numeric(col: pa.ChunkedArray) -> pa.ChunkedArray:
+    # Accept decimal comma; anything that is not a plain number becomes null
+    if pa.types.is_integer(col.type) or pa.types.is_floating(col.type):
+        return pc.cast(col, pa.float64())
+    text = pc.replace_substring(as_text(col), ',', '.')
+    try:
+        # Fast path: a single cast succeeds when every value is already numeric
+        parsed = pc.cast(text, pa.float64())
+        if pc.any(pc.is_nan(parsed)).as_py():
+            parsed = pc.if_else(pc.is_nan(parsed), pa.scalar(None, pa.float64()), parsed)
+        return parsed
+    except pa.ArrowInvalid:
+        pass
+    # A leading '+' is accepted by the pattern but not by the float cast
+    text = pc.replace_substring_regex(pc.utf8_trim_whitespace(text), r'^\+', '')
+    parseable = pc.match_substring_regex(text, numeric_text_pattern)
+    return pc.cast(pc.if_else(parseable, text, pa.scalar(None, pa.string())), pa.float64())
+
+
+@njit(nogil=True, cache=True)
+def fused_numeric_stats(values, lower, upper):
+    # Single pass over the parsed values (NaN marks null/invalid); releases the GIL
+    count = 0
+    non_integer = 0
+    out_of_range = 0
+    zero = 0
+    negative = 0
+    min_val = np.inf
+    max_val = -np.inf
+    for v in values:
+        if np.isnan(v):
+            continue
+        count += 1
+        if v < min_val:
+            min_val = v
+        if v > max_val:
+            max_val = v
+        # inf counts as non-integer, as with the former `valid % 1 != 0` (inf % 1 is NaN)
+        if not np.isfinite(v) or v != np.floor(v):
+            non_integer += 1
+        if v < lower or v > upper:
+            out_of_range += 1
+        if v == 0:
+            zero += 1
+        elif v < 0:
+            negative += 1
+    return count, min_val, max_val, non_integer, out_of_range, zero, negative
+
+
+def numeric_stats(col: str, arr: pa.ChunkedArray) -> dict:
+    numeric = parse_numeric(arr)
+    values = pc.fill_null(numeric, math.nan).to_numpy()
+    lower, upper = range_limits.get(col, (-math.inf, math.inf))
+    count, min_val, max_val, non_integer, out_of_range, zero, negative = fused_numeric_stats(
+        values, float(lower), float(upper)
+    )
+    stats = {'invalid': numeric.null_count - arr.null_count, 'count': count}
+    if count:
+        # Whole-number results print as integers (e.g. ano=2014), as pandas did for
+        # integer-parsed columns; float source columns keep their float form
+        if non_integer == 0 and not pa.types.is_floating(arr.type):
+            stats['min'] = int(min_val)
+            stats['max'] = int(max_val)
+        else:
+            stats['min'] = float(min_val)
+            stats['max'] = float(max_val)
+        stats['non_integer'] = non_integer
+        if col in range_limits:
+            stats['out_of_range'] = out_of_range
+        if col == 'QTD_VENDIDA':
+            stats['zero'] = zero
+            stats['negative'] = negative
+    return stats
+
+
+def dictionary_value_counts(arr: pa.ChunkedArray) -> dict:
+    # Histogram over dictionary codes (bincount), keyed by the trimmed dictionary
+    # value: Python only touches each distinct value once per chunk
+    values = defaultdict(int)
+    for chunk in arr.chunks:
+        codes = pc.drop_null(chunk.indices).to_numpy()
+        if not len(codes):
+            continue
+        counts = np.bincount(codes, minlength=len(chunk.dictionary))
+        labels = pc.utf8_trim_whitespace(as_text(chunk.dictionary)).to_pylist()
+        for label, count in zip(labels, counts.tolist()):
+            if count:
+                values[label] += count
+    return values
+
+
+def col_stats(col: str, arr: pa.ChunkedArray) -> dict:
+    # Partial statistics of one column in one row group; merged by merge_col_stats
+    nulls = arr.null_count
+    if pa.types.is_floating(arr.type):
+        # NaN is missing too, as with pandas isna()
+        nulls += count_true(pc.is_nan(arr))
+    stats = {'nulls': nulls}
+    has_values = nulls < len(arr)
+
+    # The trimmed string view (or code histogram) is shared by the empty-value
+    # and categorical checks
+    trimmed = None
+    value_counts = None
+    if is_text_type(arr.type) and has_values:
+        if pa.types.is_dictionary(arr.type):
+            value_counts = dictionary_value_counts(arr)
+            stats['empty'] = value_counts.get('', 0)
+        else:
+            trimmed = pc.utf8_trim_whitespace(as_text(arr))
+            stats['empty'] = count_true(pc.equal(trimmed, ''))
 
     # categorical counters
-    for col, counter in categorical_counters.items():
-        if col in df.columns:
-            values = df[col].dropna().astype(str).str.strip()
-            counter.update(values)
+    if col in categorical_counters:
+        if value_counts is None:
+            if trimmed is None:
+                trimmed = pc.utf8_trim_whitespace(as_text(arr))
+            counts = pc.value_counts(trimmed)
+            stats['counts'] = list(zip(counts.field('values').to_pylist(), counts.field('counts').to_pylist()))
+        else:
+            stats['counts'] = list(value_counts.items())
 
     # numeric-like columns
-    for col, spec in numeric_specs.items():
-        if col not in df.columns:
-            continue
-        col_series = df[col]
-        if col_series.notna().any():
-            cleaned = col_series.dropna().astype(str).str.replace(',', '.', regex=False)
-            numeric = pd.to_numeric(cleaned, errors='coerce')
-            spec['invalid'] += numeric.isna().sum()
-            valid = numeric.dropna()
-            spec['count'] += len(valid)
-            if not valid.empty:
-                min_val = valid.min()
-                max_val = valid.max()
-                if min_val < spec['min']:
-                    spec['min'] = min_val
-                if max_val > spec['max']:
-                    spec['max'] = max_val
-                if (valid % 1 != 0).any():
-                    spec['non_integer'] += (valid % 1 != 0).sum()
-                if col in range_limits:
-                    lower, upper = range_limits[col]
-                    range_issues[col] += ((valid < lower) | (valid > upper)).sum()
-                if col == 'QTD_VENDIDA':
-                    spec['zero'] += (valid == 0).sum()
-                    spec['negative'] += (valid < 0).sum()
+    if col in numeric_specs and has_values:
+        stats['numeric'] = numeric_stats(col, arr)
 
     # pattern checks
-    if 'ID' in df.columns:
-        ids = df['ID'].dropna().astype(str)
-        pattern_issues['ID'] += (~ids.str.match(id_pattern)).sum()
-    if 'CID10' in df.columns:
-        cid_values = df['CID10'].dropna().astype(str).str.upper()
-        pattern_issues['CID10'] += (~cid_values.str.match(cid10_pattern)).sum()
+    if col == 'ID':
+        stats['pattern'] = count_true(pc.invert(pc.match_substring_regex(as_text(arr), id_pattern)))
+    elif col == 'CID10':
+        cid_values = pc.utf8_upper(as_text(arr))
+        stats['pattern'] = count_true(pc.invert(pc.match_substring_regex(cid_values, cid10_pattern)))
+    return stats
+
+
+def merge_col_stats(col: str, stats: dict) -> None:
+    null_counts[col] += stats['nulls']
+    empty_counts[col] += stats.get('empty', 0)
+    if 'counts' in stats:
+        # One update per distinct value, not per row
+        counter = categorical_counters[col]
+        for value, count in stats['counts']:
+            if value is not None:
+                counter[value] += count
+    if 'numeric' in stats:
+        spec = numeric_specs[col]
+        partial = stats['numeric']
+        spec['invalid'] += partial['invalid']
+        spec['count'] += partial['count']
+        if partial['count']:
+            if partial['min'] < spec['min']:
+                spec['min'] = partial['min']
+            if partial['max'] > spec['max']:
+                spec['max'] = partial['max']
+            spec['non_integer'] += partial['non_integer']
+            if col in range_limits:
+                range_issues[col] += partial['out_of_range']
+            if col == 'QTD_VENDIDA':
+                spec['zero'] += partial['zero']
+                spec['negative'] += partial['negative']
+    if 'pattern' in stats:
+        pattern_issues[col] += stats['pattern']
+
+
+_reader = threading.local()
+
+
+def read_row_group(rg_index: int) -> pa.Table:
+    # One ParquetFile handle per worker thread; readers are not shared across threads
+    if not hasattr(_reader, 'pf'):
+        _reader.pf = pq.ParquetFile(FILE_PATH, read_dictionary=dictionary_columns)
+    return _reader.pf.read_row_group(rg_index, columns=columns, use_threads=True)
+
+
+def iter_row_groups(num_row_groups: int):
+    # Yield row groups in order while up to PREFETCH_DEPTH later ones are read and decoded
+    with ThreadPoolExecutor(max_workers=PREFETCH_DEPTH) as pool:
+        pending = deque()
+        next_index = 0
+
+        def refill() -> None:
+            nonlocal next_index
+            while next_index < num_row_groups and len(pending) < PREFETCH_DEPTH:
+                pending.append(pool.submit(read_row_group, next_index))
+                next_index += 1
+
+        refill()
+        while pending:
+            fut = pending.popleft()
+            # Top the queue back up before handing this row group to the consumer
+            refill()
+            yield fut.result()
+
+
+rows_processed = 0
+# Columns are independent: fan out per-column work (Arrow kernels release the GIL)
+# and merge the partial results sequentially, so shared state needs no locks
+with ThreadPoolExecutor(max_workers=os.cpu_count()) as column_pool:
+    for table in iter_row_groups(pf.num_row_groups):
+        rows_processed += table.num_rows
+        partials = column_pool.map(col_stats, table.column_names, table.columns)
+        for col, stats in zip(table.column_names, partials):
+            merge_col_stats(col, stats)
 
 print(f'Total rows observed: {rows_processed}')
 print('\nMissing values per column:')
@@ -128,12 +308,12 @@ for key, value in pattern_issues.items():
 print('\nCategorical value counts (top 10):')
 for col, counter in categorical_counters.items():
     print(f'  {col}:')
-    for value, count in counter.most_common(10):
+    for value, count in heapq.nlargest(10, counter.items(), key=lambda item: item[1]):
         print(f'    {value}: {count:,}')
 
 # Additional derived insights
 if numeric_specs['ano']['count']:
     years = []
-    for col_value, count in categorical_counters.get('ano', Counter()).items():
+    for col_value, count in categorical_counters.get('ano', {}).items():
         years.append((col_value, count))
 
@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 import argparse
-from itertools import combinations
 from pathlib import Path
 from typing import List, Tuple
 
@@ -11,6 +10,7 @@ TECHNICAL_COL_PREFIXES = ("_duplicated_",)
 TECHNICAL_COLS = {"row_number", "key_norm"}
 YEAR_COL_CANONICAL = "ano"
 YEAR_COL_ALTERNATIVE = "ANO_VENDA"
+NULL_SENTINEL = "\u2400NULL\u2400"
 
 
 def normalize_text_expr(s: pl.Expr) -> pl.Expr:
@@ -34,32 +34,45 @@ def compute_basic_stats(df: pl.DataFrame) -> pl.DataFrame:
     return df.select(exprs)
 
 
-def pairwise_mismatch_counts(df: pl.DataFrame, cols: List[str]) -> list[tuple[str, str, int]]:
-    results: list[tuple[str, str, int]] = []
-    # Compare on normalized string view with nulls filled to sentinel to consider null==null
-    sentinel = "\u2400NULL\u2400"
-    n = len(df)
-    for a, b in combinations(cols, 2):
-        mismatch = (
-            (
-                pl.col(a)
-                .cast(pl.Utf8)
-                .fill_null(sentinel)
-                .str.strip_chars()
-                .str.replace(r"\s+", " ", literal=False)
-                != pl.col(b)
-                .cast(pl.Utf8)
-                .fill_null(sentinel)
-                .str.strip_chars()
-                .str.replace(r"\s+", " ", literal=False)
-            )
-            .sum()
-            .alias("mismatch")
-        )
-        m = df.select(mismatch).item()
-        if m == 0:
-            results.append((a, b, m))
-    return results
+def compare_view_expr(c: str) -> pl.Expr:
+    # Normalized string view with nulls filled to sentinel to consider null==null
+    return (
+        pl.col(c)
+        .cast(pl.Utf8)
+        .fill_null(NULL_SENTINEL)
+        .str.strip_chars()
+        .str.replace(r"\s+", " ", literal=False)
+    )
+
+
+def column_fingerprints(view: pl.DataFrame) -> dict[int, list[str]]:
+    # One 64-bit fingerprint per column: wrapping sum of hash(row position, value),
+    # so it is order-sensitive; identical columns always share a fingerprint
+    position = pl.int_range(pl.len()).alias("__pos__")
+    fingerprints = view.select(
+        [pl.struct(position, pl.col(c)).hash(seed=0).sum().alias(c) for c in view.columns]
+    ).row(0)
+    groups: dict[int, list[str]] = {}
+    for c, fp in zip(view.columns, fingerprints):
+        groups.setdefault(fp, []).append(c)
+    return groups
+
+
+def duplicate_column_groups(df: pl.DataFrame, cols: List[str]) -> list[list[str]]:
+    groups: list[list[str]] = []
+    # Normalize every column once; fingerprints and exact checks reuse the view
+    view = df.select([compare_view_expr(c).alias(c) for c in cols])
+    # Columns sharing a fingerprint are confirmed against one representative in a
+    # single select; members that differ (hash collisions) are regrouped
+    for candidates in column_fingerprints(view).values():
+        while len(candidates) > 1:
+            rep, rest = candidates[0], candidates[1:]
+            differs = view.select([(pl.col(rep) != pl.col(c)).any().alias(c) for c in rest]).row(0)
+            same = [c for c, d in zip(rest, differs) if not d]
+            if same:
+                groups.append([rep, *same])
+            candidates = [c for c, d in zip(rest, differs) if d]
+    return groups
 
 
 def main() -> None:
@@ -133,13 +146,13 @@ def main() -> None:
             rec_drop.append(c)
 
     # Pairwise equal columns on sample
-    equal_pairs = pairwise_mismatch_counts(sample_df, sample_df.columns)
-    if equal_pairs:
-        print("Pares de colunas idênticas (na amostra):")
-        for a, b, _ in equal_pairs:
-            print(f"- {a} == {b}")
+    duplicate_groups = duplicate_column_groups(sample_df, sample_df.columns)
+    if duplicate_groups:
+        print("Grupos de colunas idênticas (na amostra):")
+        for group in duplicate_groups:
+            print(f"- {' == '.join(group)}")
             # Prefer keep canonical 'ano' instead of 'ANO_VENDA'
-            if {a, b} == {YEAR_COL_CANONICAL, YEAR_COL_ALTERNATIVE}:
+            if {YEAR_COL_CANONICAL, YEAR_COL_ALTERNATIVE} <= set(group):
                 rec = YEAR_COL_ALTERNATIVE if YEAR_COL_CANONICAL in cols else YEAR_COL_CANONICAL
                 if rec not in rec_drop:
                     rec_drop.append(rec)
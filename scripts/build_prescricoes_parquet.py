@@ -6,7 +6,23 @@ from pathlib import Path
 from typing import List, Tuple
 
 import polars as pl
-import chardet
+
+
+AHS_FLAG_COL = "Ansiolítico/Sedativo/Hipnótico"
+CLASSE_COLS = ["Classe_1", "Classe_2", "Classe_3", "Classe_4"]
+FLAG_COLS = ["is_ahs", "is_opioid"]
+# Low-cardinality string columns written dictionary-encoded
+CATEGORICAL_COLS = [
+    "PRINCIPIO_ATIVO",
+    "SEXO",
+    "CONSELHO_PRESCRITOR",
+    "TIPO_RECEITUARIO",
+    "UNIDADE_IDADE",
+    "UNIDADE_MEDIDA",
+    AHS_FLAG_COL,
+    *CLASSE_COLS,
+]
+CATEGORICAL_PREFIXES = ("UF_",)
 
 
 def detect_sep(first_line: str) -> str:
@@ -31,7 +47,24 @@ def sanitize_df_columns(df: pl.DataFrame) -> pl.DataFrame:
     return df
 
 
-def build_dict_table(dict_path: str) -> tuple[pl.LazyFrame, List[str]]:
+def build_flag_exprs(cols: List[str]) -> List[pl.Expr]:
+    # Boolean flags used by filter_controlled_parquet.py: A/S/H by dictionary flag,
+    # opioid by any class containing 'opio'
+    is_ahs = pl.lit(False)
+    if AHS_FLAG_COL in cols:
+        is_ahs = pl.col(AHS_FLAG_COL).cast(pl.Utf8).str.to_lowercase().str.strip_chars().eq("sim").fill_null(False)
+
+    is_opioid = pl.lit(False)
+    classe_cols = [c for c in CLASSE_COLS if c in cols]
+    if classe_cols:
+        is_opioid = pl.any_horizontal(
+            [pl.col(c).cast(pl.Utf8).str.to_lowercase().str.contains("opio") for c in classe_cols]
+        ).fill_null(False)
+
+    return [is_ahs.alias("is_ahs"), is_opioid.alias("is_opioid")]
+
+
+def build_dict_table(dict_path: str) -> tuple[pl.DataFrame, List[str]]:
     # Read with proper encoding and semicolon separator
     df = pl.read_csv(
         dict_path,
@@ -71,18 +104,23 @@ def build_dict_table(dict_path: str) -> tuple[pl.LazyFrame, List[str]]:
     if "alias_col" in long.columns:
         long = long.drop("alias_col")
 
-    # Return LazyFrame and descriptor column names to detect match later if needed
-    return long.lazy(), descriptor_cols
+    # Normalize the filter flags once on the (small) dictionary instead of per row
+    long = long.with_columns(build_flag_exprs(descriptor_cols))
+
+    # Return the materialized mapping (one row per key_norm) and descriptor column names
+    return long, descriptor_cols
 
 
 def read_header(path: str) -> Tuple[List[str], str]:
+    # Inputs are UTF-8 or Latin-1; the first line is only used to pick the separator
     with open(path, "rb") as f:
-        head = f.read(8192)
-    enc = chardet.detect(head).get("encoding") or "utf-8"
+        head = f.read(4096)
     try:
-        first_line = head.decode(enc, errors="ignore").splitlines()[0]
-    except Exception:
-        first_line = ""
+        text = head.decode("utf-8")
+    except UnicodeDecodeError:
+        text = head.decode("latin1")
+    lines = text.splitlines()
+    first_line = lines[0] if lines else ""
     sep = detect_sep(first_line)
     # Try to read zero rows just to get schema
     cols: List[str]
@@ -103,16 +141,18 @@ def year_from_filename(path: str) -> str:
 
 def build_lazy_for_csv(
     path: str,
+    file_cols: List[str],
     superset_cols: List[str],
     sep: str,
-    dict_map: pl.LazyFrame,
+    dict_map: pl.DataFrame,
 ) -> pl.LazyFrame:
     ano = year_from_filename(path)
     lf = pl.scan_csv(path, separator=sep, ignore_errors=True)
 
-    # Ensure every superset column exists and is Utf8 for schema stability
+    # Ensure every superset column exists and is Utf8 for schema stability.
+    # file_cols comes from read_header, so the scan's schema is never resolved here
     selected = []
-    lf_cols = set(lf.collect_schema().names())
+    lf_cols = set(file_cols)
     for c in superset_cols:
         if c in lf_cols:
             selected.append(pl.col(c).cast(pl.Utf8, strict=False).alias(c))
@@ -123,16 +163,27 @@ def build_lazy_for_csv(
     # Add ano, row_number (1-based) and ID
     lf = lf.with_columns(pl.lit(ano).alias("ano"))
     lf = lf.with_row_index(name="row_number", offset=1)
+    # ano is constant per file, so the "AAAA-" prefix is part of the format string
+    # and each row only renders its zero-padded sequence number
     lf = lf.with_columns(
-        (pl.col("ano") + pl.lit("-") + pl.col("row_number").cast(pl.Utf8).str.zfill(8)).alias("ID")
+        pl.format(f"{ano}-{{}}", pl.col("row_number").cast(pl.Utf8).str.zfill(8)).alias("ID")
     )
 
-    # Normalize join key and left join dict mapping
+    # Normalize lookup key and map dictionary columns
     if "PRINCIPIO_ATIVO" in superset_cols:
         lf = lf.with_columns(normalize_key_expr(pl.col("PRINCIPIO_ATIVO")).alias("key_norm"))
-        lf = lf.join(dict_map, on="key_norm", how="left")
+        # One dictionary lookup per row returning all mapped columns as a struct,
+        # instead of a hash join per file
+        values = dict_map.select(pl.struct(pl.exclude("key_norm")).alias("_dict"))["_dict"]
+        lf = lf.with_columns(
+            pl.col("key_norm")
+            .replace_strict(dict_map["key_norm"], values, default=None, return_dtype=values.dtype)
+            .alias("_dict")
+        ).unnest("_dict")
+        lf = lf.with_columns([pl.col(c).fill_null(False) for c in FLAG_COLS])
     else:
         lf = lf.with_columns(pl.lit(None).alias("key_norm"))
+        lf = lf.with_columns([pl.lit(False).alias(c) for c in FLAG_COLS])
 
     return lf
 
@@ -179,8 +230,8 @@ def main() -> None:
 
     # Build lazy frames per file
     lazy_frames: list[pl.LazyFrame] = []
-    for fp, _cols, sep in file_meta:
-        lf = build_lazy_for_csv(fp, superset_cols, sep, dict_map)
+    for fp, cols, sep in file_meta:
+        lf = build_lazy_for_csv(fp, cols, superset_cols, sep, dict_map)
         lazy_frames.append(lf)
 
     # Union
@@ -193,18 +244,30 @@ def main() -> None:
         "key_norm",  # technical (join helper)
         "_duplicated_0",  # artifact from joins
     ]
-    drop_existing = [c for c in cols_to_drop if c in all_lf.collect_schema().names()]
+    # Resolve the concatenated schema once; drop and reorder are derived from it
+    final_cols = all_lf.collect_schema().names()
+    drop_existing = [c for c in cols_to_drop if c in final_cols]
     if drop_existing:
         all_lf = all_lf.drop(drop_existing)
 
     # Reorder columns so that ID, ano and DESCRICAO_APRESENTACAO come first
-    schema_cols = all_lf.collect_schema().names()
+    schema_cols = [c for c in final_cols if c not in drop_existing]
     first_order = [c for c in ["ID", "ano", "DESCRICAO_APRESENTACAO"] if c in schema_cols]
     if first_order:
         all_lf = all_lf.select([*(pl.col(c) for c in first_order), pl.all().exclude(first_order)])
+
+    categorical = [c for c in schema_cols if c in CATEGORICAL_COLS or c.startswith(CATEGORICAL_PREFIXES)]
+    if categorical:
+        all_lf = all_lf.with_columns([pl.col(c).cast(pl.Categorical) for c in categorical])
     out_path = Path(args.output)
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    all_lf.sink_parquet(str(out_path), compression="snappy")
+    all_lf.sink_parquet(
+        str(out_path),
+        compression="zstd",
+        compression_level=3,
+        statistics=True,
+        row_group_size=1_048_576,
+    )
     print(f"Parquet escrito em: {out_path}")
 
     # Optional: unmatched report
@@ -2,29 +2,40 @@
 import argparse
 from pathlib import Path
 
-import polars as pl
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 
 
-def normalize_text_expr(s: pl.Expr) -> pl.Expr:
-    return (
-        s.cast(pl.Utf8)
-        .str.to_lowercase()
-        .str.strip_chars()
-        .str.replace(r"\s+", " ", literal=False)
+FLAG_COLS = ["is_ahs", "is_opioid"]
+ROW_GROUP_SIZE = 1_048_576
+
+
+def normalize_text_expr(s: pc.Expression) -> pc.Expression:
+    return pc.replace_substring_regex(
+        pc.utf8_trim_whitespace(pc.utf8_lower(s.cast(pa.string()))),
+        r"\s+",
+        " ",
     )
 
 
-def build_filter_expr(cols: list[str]) -> pl.Expr:
+def build_filter_expr(cols: list[str]) -> pc.Expression:
     """Return an expression selecting A/S/H by dictionary flag or any class containing 'opio'."""
-    cond_ahs = pl.lit(False)
+    # Parquets written by build_prescricoes_parquet.py carry pre-normalized boolean flags,
+    # which the scanner can check against row-group statistics
+    if all(c in cols for c in FLAG_COLS):
+        return pc.field("is_ahs") | pc.field("is_opioid")
+
+    cond_ahs = pc.scalar(False)
     flag_col = "Ansiolítico/Sedativo/Hipnótico"
     if flag_col in cols:
-        cond_ahs = normalize_text_expr(pl.col(flag_col)).eq("sim")
+        cond_ahs = pc.equal(normalize_text_expr(pc.field(flag_col)), "sim")
 
-    cond_opio = pl.lit(False)
+    cond_opio = pc.scalar(False)
     for c in ["Classe_1", "Classe_2", "Classe_3", "Classe_4"]:
         if c in cols:
-            cond_opio = cond_opio | normalize_text_expr(pl.col(c)).str.contains("opio")
+            cond_opio = cond_opio | pc.match_substring(normalize_text_expr(pc.field(c)), "opio")
 
     return cond_ahs | cond_opio
 
@@ -47,24 +58,37 @@ def main() -> None:
     if not in_path.exists():
         raise SystemExit(f"Arquivo não encontrado: {in_path}")
 
-    lf = pl.scan_parquet(str(in_path))
-    cols = lf.columns
+    dataset = ds.dataset(str(in_path), format="parquet")
+    cols = dataset.schema.names
 
+    # Filter is pushed down to the scan: row groups whose statistics rule out a match are skipped
     filt = build_filter_expr(cols)
-    out_lf = lf.filter(filt)
+    scanner = dataset.scanner(filter=filt)
 
     out_path = Path(args.out)
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_lf.sink_parquet(str(out_path), compression="snappy")
+    # Stream matching batches to the output, buffering at most one row group in memory
+    kept = 0
+    buffered: list[pa.RecordBatch] = []
+    buffered_rows = 0
+    with pq.ParquetWriter(str(out_path), scanner.projected_schema, compression="zstd") as writer:
+        for batch in scanner.to_batches():
+            if not batch.num_rows:
+                continue
+            buffered.append(batch)
+            buffered_rows += batch.num_rows
+            kept += batch.num_rows
+            if buffered_rows >= ROW_GROUP_SIZE:
+                writer.write_table(pa.Table.from_batches(buffered))
+                buffered, buffered_rows = [], 0
+        if buffered:
+            writer.write_table(pa.Table.from_batches(buffered))
 
     # Print basic stats
-    total = lf.select(pl.len()).collect().item()
-    kept = out_lf.select(pl.len()).collect().item()
+    total = dataset.count_rows()
     print(f"Filtrado: {kept} de {total} linhas -> {kept/total:.2%}")
     print(f"Parquet salvo em: {out_path}")
 
 
 if __name__ == "__main__":
     main()
-
-
@@ -34,18 +34,69 @@ def verify_parquet(parquet_path: str, dict_path: str, sample_rows: int = 5) -> N
         raise SystemExit(f"Arquivo não encontrado: {parquet_path}")
 
     lf = pl.scan_parquet(parquet_path)
-    schema = lf.schema
+    schema = lf.collect_schema()
     cols = list(schema.keys())
 
+    # Só as colunas verificadas são lidas do Parquet nas agregações
+    checked_cols = [c for c in ["ID", "ano", "key_norm", "PRINCIPIO_ATIVO"] if c in cols]
+    checks_lf = lf.select(checked_cols) if checked_cols else lf
+
+    # Todas as agregações em uma única chamada, para que o arquivo seja lido uma vez
+    stats_exprs = [pl.len().alias("total")]
+    if "ID" in cols:
+        if "ano" in cols:
+            # ID é montado como ano + '-' + sequencial: compara os 4 primeiros caracteres
+            # com 'ano' e o 5º com '-', sem concatenar strings por linha.
+            # Linhas com ID ou ano nulos ficam fora da contagem
+            stats_exprs.append(
+                (
+                    pl.col("ano").is_not_null()
+                    & (
+                        (pl.col("ID").str.slice(0, 4) != pl.col("ano"))
+                        | (pl.col("ID").str.slice(4, 1) != "-")
+                    )
+                ).sum().alias("n_mismatch")
+            )
+    if "key_norm" in cols:
+        stats_exprs.append(pl.col("key_norm").is_not_null().sum().alias("mapeados"))
+    queries: dict[str, pl.LazyFrame] = {"stats": checks_lf.select(stats_exprs)}
+
+    if "ID" in cols:
+        queries["n_dups"] = (
+            checks_lf.group_by("ID").len().filter(pl.col("len") > 1).select(pl.len().alias("n_dups"))
+        )
+
+    if "ano" in cols:
+        year_aggs = [pl.len()]
+        if "key_norm" in cols:
+            year_aggs.append(pl.col("key_norm").is_null().sum().alias("nao_mapeados"))
+        queries["by_year"] = checks_lf.group_by("ano").agg(year_aggs).sort("ano")
+
+    if "key_norm" in cols and "PRINCIPIO_ATIVO" in cols:
+        queries["top_unmapped"] = (
+            checks_lf.filter(pl.col("key_norm").is_null())
+            .group_by("ano", "PRINCIPIO_ATIVO")
+            .len()
+            .sort("len", descending=True)
+            .limit(10)
+        )
+
+    # collect_all compartilha a leitura projetada entre as consultas
+    results = dict(zip(queries, pl.collect_all(list(queries.values()))))
+    stats = results["stats"].row(0, named=True)
+    by_year = results.get("by_year")
+    top_unmapped = results.get("top_unmapped")
+
     print("Resumo do arquivo Parquet:")
-    total_rows = lf.select(pl.len()).collect().item()
+    total_rows = stats["total"]
     print(f"- linhas: {total_rows}")
     print(f"- colunas: {len(cols)}")
     print(f"- campos: {cols}")
 
     # Amostra
     try:
-        sample_df = lf.fetch(sample_rows)
+        # head() lê apenas as primeiras linhas; todas as colunas são exibidas na amostra
+        sample_df = lf.head(sample_rows).collect()
         print(f"Amostra ({len(sample_df)} linhas):")
         print(sample_df)
     except Exception as e:
@@ -61,26 +112,14 @@ def verify_parquet(parquet_path: str, dict_path: str, sample_rows: int = 5) -> N
 
     # Unicidade do ID
     if "ID" in cols:
-        dup = (
-            lf.group_by("ID").len().filter(pl.col("len") > 1).select(pl.len().alias("n_dups")).collect().item()
-        )
-        print(f"IDs duplicados: {dup}")
+        print(f"IDs duplicados: {results['n_dups'].item()}")
 
         # Formato do ID e consistência com ano (prefixo AAAA-)
         if "ano" in cols:
-            # Checar que prefixo do ID é o ano + '-'
-            mismatches = (
-                lf.select(
-                    (
-                        (pl.col("ID").str.slice(0, 5) != (pl.col("ano") + pl.lit("-")))
-                    ).sum().alias("n_mismatch")
-                ).collect().item()
-            )
-            print(f"IDs com prefixo divergente de 'ano-': {mismatches}")
+            print(f"IDs com prefixo divergente de 'ano-': {stats['n_mismatch']}")
 
     # Distribuição por ano
-    if "ano" in cols:
-        by_year = lf.group_by("ano").len().sort("ano").collect()
+    if by_year is not None:
         print("Linhas por ano:")
         print(by_year)
 
@@ -91,18 +130,10 @@ def verify_parquet(parquet_path: str, dict_path: str, sample_rows: int = 5) -> N
         print(f"Aviso: colunas do dicionário ausentes no Parquet: {dict_missing}")
 
     if "key_norm" in cols:
-        matched = lf.select((pl.col("key_norm").is_not_null()).sum().alias("mapeados")).collect().item()
+        matched = stats["mapeados"]
         print(f"Registros mapeados no dicionário: {matched} de {total_rows} ({matched/total_rows:.2%})")
         # Principais não mapeados
-        if "PRINCIPIO_ATIVO" in cols:
-            top_unmapped = (
-                lf.filter(pl.col("key_norm").is_null())
-                .group_by("ano", "PRINCIPIO_ATIVO")
-                .len()
-                .sort("len", descending=True)
-                .limit(10)
-                .collect()
-            )
+        if top_unmapped is not None:
             print("Top 10 PRINCIPIO_ATIVO não mapeados por contagem:")
             print(top_unmapped)
     else: